@@ -1,11 +1,72 @@
 import streamlit as st
+import hmac
 import sqlite3
 import pandas as pd
-from database import MealDatabase, MEAL_TYPES, UNITS, CATEGORIES
-from format import format_amount
+from database import MealDatabase, MEAL_TYPES, UNITS, CATEGORIES, MEAL_TYPE_IDX, UNIT_IDX, CATEGORY_IDX
+from format import format_amount_series
 
-# Initialize database
-db = MealDatabase()
+# Database is created once and its connection pool reused across reruns and sessions
+@st.cache_resource(show_spinner=False)
+def get_db():
+    return MealDatabase()
+
+# ------------ #
+# CACHED READS #
+# ------------ #
+
+@st.cache_data(ttl=300)
+def _get_recipe_buckets(meal_type=None):
+    # {meal_type: [(id, name, checkbox key, button key), ...]} sorted by name,
+    # so rendering the grid needs no pandas work
+    recipes = db.get_recipes(meal_type)
+    # Widget keys for the recipe grid, built once per load instead of per row
+    recipes['_cb_key'] = 'recipe_' + recipes['id'].astype(str)
+    recipes['_btn_key'] = 'details_' + recipes['id'].astype(str)
+    columns = ['id', 'name', '_cb_key', '_btn_key']
+    return {meal: [(int(recipe_id), name, cb_key, btn_key)
+                   for recipe_id, name, cb_key, btn_key in group[columns].itertuples(index=False, name=None)]
+            for meal, group in recipes.groupby('meal_type', sort=False, dropna=False)}
+
+@st.cache_data(ttl=300)
+def _get_recipe_ids_by_name():
+    # Sorted name -> id mapping for O(1) lookups on the edit page
+    return {name: recipe_id for recipe_id, name in db.get_recipe_names()}
+
+@st.cache_data(ttl=300)
+def _get_selected_ids():
+    return db.get_selected_ids()
+
+@st.cache_data(ttl=300)
+def _get_recipe_details(recipe_id: int):
+    return db.get_recipe_details(recipe_id)
+
+# Shorter TTL so additions from other sessions show up quickly
+@st.cache_data(ttl=60)
+def _has_shopping_items():
+    return db.has_shopping_items()
+
+@st.cache_data(ttl=60)
+def _get_shopping_list():
+    return db.get_shopping_list()
+
+def _clear_recipe_cache():
+    # Nach Änderungen an Rezepten oder der Auswahl veraltete Daten verwerfen
+    _get_recipe_buckets.clear()
+    _get_recipe_ids_by_name.clear()
+    _get_selected_ids.clear()
+    _get_recipe_details.clear()
+    _has_shopping_items.clear()
+    _get_shopping_list.clear()
+
+def _clear_selection_cache():
+    # Die Auswahl betrifft nur ausgewählte Rezepte und die Einkaufsliste
+    _get_selected_ids.clear()
+    _has_shopping_items.clear()
+    _get_shopping_list.clear()
+
+def _clear_shopping_cache():
+    _has_shopping_items.clear()
+    _get_shopping_list.clear()
 
 # Set page config
 st.set_page_config(
@@ -14,6 +75,25 @@ st.set_page_config(
     layout="wide"
 )
 
+# Initialize database (after set_page_config, which must be the first Streamlit command)
+db = get_db()
+
+# CSS
+st.markdown(
+    """
+    <style>
+    .st-emotion-cache-rb05al {
+        min-width: 0px;}
+    .st-emotion-cache-bfpqqo {
+        min-width: 0px;}
+    .st-emotion-cache-1hyd1ho p {
+        word-break: normal;
+        white-space: normal;}
+    </style>
+    """,
+    unsafe_allow_html=True
+)
+
 def main():
     st.title("Meal Planner 🥗")
 
@@ -39,71 +119,71 @@ def main():
 def show_recipes_page():
     st.header("Gerichte")
 
-    # Get all recipes and currently selected ones
-    all_recipes = db.get_all_recipes()
-    selected_recipes = db.get_selected_recipes()
-    # Update selected_ids from the database
-    selected_ids = selected_recipes['recipe_id'].tolist()
+    # Get currently selected recipe ids from the database
+    selected_ids = set(_get_selected_ids())
 
     # Clear selection button
     if st.button("Auswahl zurücksetzen"):
         # Clear selected recipes in the database
         db.update_selected_recipes([])
-        selected_ids.clear()  # Clear the selected_ids list to reflect the reset
+        selected_ids.clear()  # Clear the selected_ids set to reflect the reset
         db.clear_additional_ingredients()  # Clear the additional ingredients table
-        st.rerun()  # Rerun the app
+        _clear_selection_cache()
+        # Uncheck all recipe checkboxes instead of rerunning the app
+        for key in list(st.session_state.keys()):
+            if key.startswith('recipe_'):
+                st.session_state[key] = False
 
-    # Filter by meal type
+    # Filter by meal type (in SQL)
     meal_type = st.selectbox("Nach Mahlzeit filtern", ["Alle"] + MEAL_TYPES)
-    if meal_type != "Alle":
-        all_recipes = all_recipes[all_recipes['meal_type'] == meal_type]
-
-    # CSS
-    st.markdown(
-        """
-        <style>
-        .st-emotion-cache-rb05al {
-            min-width: 0px;}
-        .st-emotion-cache-bfpqqo {
-            min-width: 0px;}
-        .st-emotion-cache-1hyd1ho p {
-            word-break: normal;
-            white-space: normal;}
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
-    st.markdown('<div class="horizontal-container">', unsafe_allow_html=True)
+    recipe_buckets = _get_recipe_buckets(None if meal_type == "Alle" else meal_type)
+
+    # Remember the last committed selection for fragment reruns
+    st.session_state.committed_selection = frozenset(selected_ids)
+    _recipe_grid(recipe_buckets)
+
+
+@st.fragment
+def _recipe_grid(recipe_buckets):
+    # Only this block reruns when a checkbox or details button is clicked
     # Display recipes grouped by meal type
     selected_recipe_ids = []
+    # Every loaded recipe counts as shown, also those with a meal type outside MEAL_TYPES
+    shown_ids = {row[0] for rows in recipe_buckets.values() for row in rows}
+    # Read the committed selection once instead of per row (keys are precomputed)
+    committed = st.session_state.committed_selection
     for meal in MEAL_TYPES:
         st.subheader(meal)  # Display meal type header
-        meal_recipes = all_recipes[all_recipes['meal_type'] == meal].sort_values(
-            'name')
 
-        for _, recipe in meal_recipes.iterrows():
+        for recipe_id, recipe_name, cb_key, btn_key in recipe_buckets.get(meal, []):
             col1, col2 = st.columns([0.1, 0.9])
             with col1:
                 # Initialize session_state for the checkbox if it doesn't exist
                 is_selected = st.checkbox(
-                    "x", key=f"recipe_{recipe['id']}", value=recipe['id'] in selected_ids, label_visibility="hidden")
+                    "x", key=cb_key,
+                    value=recipe_id in committed,
+                    label_visibility="hidden")
 
                 if is_selected:
-                    selected_recipe_ids.append(recipe['id'])
+                    selected_recipe_ids.append(recipe_id)
 
             with col2:
-                if st.button(recipe['name'], key=f"details_{recipe['id']}"):
-                    show_recipe_details(recipe['id'])
+                if st.button(recipe_name, key=btn_key):
+                    show_recipe_details(recipe_id)
 
-    st.markdown('</div>', unsafe_allow_html=True)
+    # Keep selected recipes that are hidden by the meal type filter
+    hidden = committed.difference(shown_ids)
+    new_selection = frozenset(selected_recipe_ids) | hidden
 
-    # Update selected recipes in database
-    if len(selected_recipe_ids) > 0:
-        db.update_selected_recipes(selected_recipe_ids)
+    # Update selected recipes in database only if the selection changed
+    if new_selection != committed:
+        db.update_selected_recipes(list(new_selection))
+        st.session_state.committed_selection = new_selection
+        _clear_selection_cache()
 
 
 def show_recipe_details(recipe_id):
-    recipe, ingredients = db.get_recipe_details(recipe_id)
+    recipe, ingredients = _get_recipe_details(recipe_id)
 
     if recipe is None:
         st.error("Rezept nicht gefunden!")
@@ -112,20 +192,18 @@ def show_recipe_details(recipe_id):
     st.write(f"**Mahlzeit:** {recipe['meal_type']}")
     st.write(f"**Name:** {recipe['name']}")
     st.write("**Zutaten:**")
-    ingredients['formatted_amount'] = ingredients['amount'].apply(format_amount)
-    ingredients = ingredients.rename(columns={
-        'name': 'Zutat',
-        'formatted_amount': 'M',
-        'unit': 'E'
+    # Build the display frame in one step without copying or mutating the cached frame
+    display = pd.DataFrame({
+        'Zutat': ingredients['name'],
+        'M': format_amount_series(ingredients['amount']),
+        'E': ingredients['unit']
     })
-    st.dataframe(ingredients[['Zutat', 'M', 'E']], hide_index=True)
+    st.dataframe(display, hide_index=True)
 
     st.write("**Zubereitung:**")
-    preparation = recipe['preparation'].split('\n')
-    preparation = [x for x in preparation if x != '']
-    for i, step in enumerate(preparation, start=1):
-        # Display each step as a numbered item
-        st.write(f"{i}. {step.strip()}")
+    steps = [step.strip() for step in recipe['preparation'].split('\n') if step.strip()]
+    # Display all steps as one numbered list
+    st.markdown('\n'.join(f"{i}. {step}" for i, step in enumerate(steps, start=1)))
 
 # ------------ #
 # SHOPPINGLIST #
@@ -134,24 +212,25 @@ def show_recipe_details(recipe_id):
 def show_shopping_page():
     st.header("Einkaufsliste")
 
-    shopping_list = db.get_shopping_list()
-    if shopping_list.empty:  # Check if list is empty
+    # Skip the shopping list query if no recipe is selected and nothing was added
+    shopping_list = _get_shopping_list() if _has_shopping_items() else None
+    if shopping_list is None or shopping_list.empty:  # Check if list is empty
         st.info("Die Einkaufsliste ist leer.")
         return
     
     # Formatieren der Menge
-    shopping_list['Menge'] = shopping_list['total_amount'].apply(format_amount)
+    shopping_list['Menge'] = format_amount_series(shopping_list['total_amount'])
 
-    # Group by category
-    for category in CATEGORIES:
-        category_items = shopping_list[shopping_list['category'] == category]
-        if not category_items.empty:
+    # Rows arrive sorted by category, start a new subheader whenever it changes
+    current_category = None
+    for category, item_name, amount, unit in shopping_list[['category', 'name', 'Menge', 'unit']].itertuples(index=False, name=None):
+        if category != current_category:
             st.subheader(category)
-            for _, item in category_items.iterrows():
-                st.checkbox(
-                    f"{item['name']}: {item['Menge']} {item['unit']}",
-                    key=f"shop_{item['name']}"
-                )
+            current_category = category
+        st.checkbox(
+            f"{item_name}: {amount} {unit}",
+            key=f"shop_{item_name}"
+        )
     
     # Zusätzliche Einkäufe
     # Initialisiere den Zustand, falls noch nicht geschehen
@@ -162,12 +241,21 @@ def show_shopping_page():
     if new_ingredient_name and new_ingredient_name not in st.session_state.ingredients_added:
         # Füge die Zutat hinzu
         db.add_additional_ingredient(new_ingredient_name)
+        _clear_shopping_cache()
         st.success(f'{new_ingredient_name.capitalize()} hinzugefügt!')
         
         # Markiere die Zutat als hinzugefügt
         st.session_state.ingredients_added.add(new_ingredient_name)        
         st.rerun()
 
+# -------- #
+# PASSWORD #
+# -------- #
+
+def check_password(password):
+    # Constant-time comparison so the check does not leak how many characters match
+    return hmac.compare_digest(password.encode(), st.secrets["APP_PASSWORD"].encode())
+
 # ---------- #
 # NEW RECIPE #
 # ---------- #
@@ -178,7 +266,7 @@ def show_new_recipe_page():
     # Password input
     password = st.text_input("Password", type="password")
 
-    if password != st.secrets["APP_PASSWORD"]:
+    if not check_password(password):
         st.error("Incorrect password. Access denied.")
     else:
         # Proceed with the rest of the page functionality
@@ -232,6 +320,7 @@ def show_new_recipe_page():
                 else:
                     try:
                         db.add_recipe(meal_type, name, preparation, ingredients)
+                        _clear_recipe_cache()
                         st.success("Rezept erfolgreich gespeichert!")
                         st.session_state.ingredient_count = 1  # Reset ingredient count
                     except sqlite3.IntegrityError:
@@ -244,7 +333,7 @@ def show_edit_recipe_page():
     # Password input
     password = st.text_input("Password", type="password")
 
-    if password != st.secrets["APP_PASSWORD"]:
+    if not check_password(password):
         st.error("Incorrect password. Access denied.")
     else:
         # Proceed with the rest of the page functionality
@@ -254,13 +343,12 @@ def show_edit_recipe_page():
             if 'edit_ingredient_count' in st.session_state:
                 del st.session_state.edit_ingredient_count
 
-        all_recipes = db.get_all_recipes()
-        recipe_names = all_recipes.sort_values('name')['name'].tolist()
-        recipe_name = st.selectbox("Rezeptname", recipe_names, on_change=update_ingredient_count)
-        recipe_id = int(all_recipes[all_recipes['name'] == recipe_name].iloc[0]['id'])
+        recipe_ids_by_name = _get_recipe_ids_by_name()
+        recipe_name = st.selectbox("Rezeptname", list(recipe_ids_by_name), on_change=update_ingredient_count)
+        recipe_id = recipe_ids_by_name[recipe_name]
 
         # After fetching the new recipe and its ingredients
-        recipe, ingredients = db.get_recipe_details(recipe_id)
+        recipe, ingredients = _get_recipe_details(recipe_id)
 
         # Initialize ingredient count if not already set
         if 'edit_ingredient_count' not in st.session_state:
@@ -269,19 +357,19 @@ def show_edit_recipe_page():
         # Edit recipe form
         with st.form("edit_recipe"):
             name = st.text_input("Rezeptname", value=recipe['name'])
-            meal_type = st.selectbox("Mahlzeit", MEAL_TYPES, index=MEAL_TYPES.index(recipe['meal_type']))
+            meal_type = st.selectbox("Mahlzeit", MEAL_TYPES, index=MEAL_TYPE_IDX[recipe['meal_type']])
             preparation = st.text_area("Zubereitung", value=recipe['preparation'])
 
             st.subheader("Zutaten")
             edited_ingredients = []
 
+            # Existing ingredients as plain tuples instead of one Series per field
+            ingredient_rows = list(ingredients[['name', 'amount', 'unit', 'category']].itertuples(index=False, name=None))
+
             # Display existing ingredients with editable fields
             for idx in range(st.session_state.edit_ingredient_count):
-                if idx < len(ingredients):
-                    ing_name = ingredients.iloc[idx]['name']
-                    amount = ingredients.iloc[idx]['amount']
-                    unit = ingredients.iloc[idx]['unit']
-                    category = ingredients.iloc[idx]['category']
+                if idx < len(ingredient_rows):
+                    ing_name, amount, unit, category = ingredient_rows[idx]
                 else:
                     ing_name, amount, unit, category = "", 0, "g", CATEGORIES[0]
 
@@ -291,9 +379,9 @@ def show_edit_recipe_page():
                 with col2:
                     amount = st.number_input(f"Menge {idx + 1}", value=float(amount), min_value=0.0, key=f"amount_{idx}")
                 with col3:
-                    unit = st.selectbox(f"Einheit {idx + 1}", UNITS, index=UNITS.index(unit), key=f"unit_{idx}")
+                    unit = st.selectbox(f"Einheit {idx + 1}", UNITS, index=UNIT_IDX[unit], key=f"unit_{idx}")
                 with col4:
-                    category = st.selectbox(f"Kategorie {idx + 1}", CATEGORIES, index=CATEGORIES.index(category), key=f"category_{idx}")
+                    category = st.selectbox(f"Kategorie {idx + 1}", CATEGORIES, index=CATEGORY_IDX[category], key=f"category_{idx}")
 
                 if ing_name and amount > 0:
                     edited_ingredients.append((ing_name, amount, unit, category))
@@ -309,6 +397,7 @@ def show_edit_recipe_page():
                 else:
                     try:
                         db.edit_recipe(recipe_id, meal_type, name, preparation, edited_ingredients)
+                        _clear_recipe_cache()
                         st.success("Rezept erfolgreich gespeichert!")
                         st.session_state.ingredient_count = len(edited_ingredients)  # Reset ingredient count
                     except sqlite3.IntegrityError:
@@ -317,6 +406,7 @@ def show_edit_recipe_page():
         # Delete button
         if st.button("Rezept löschen"):
             db.delete_recipe(recipe_id)
+            _clear_recipe_cache()
             st.success("Rezept erfolgreich gelöscht!")
 
 
@@ -1,6 +1,6 @@
 import streamlit as st
 import psycopg2
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, create_engine, text
 import pandas as pd
 from typing import List, Tuple
 
@@ -52,34 +52,71 @@ class MealDatabase:
                     amount DECIMAL(10,2) DEFAULT 1,
                     unit VARCHAR(10) DEFAULT 'Stk'
                 );"""))
+
+            # Indizes für sortierte Rezeptlisten und Zutaten pro Rezept
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_recipes_meal_name ON recipes(meal_type, name);"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_ingredients_recipe ON ingredients(recipe_id);"))
             conn.commit()
 
     # ------- #
     # RECIPES #
     # ------- #
-    def get_all_recipes(self):
-        return pd.read_sql("SELECT * FROM recipes", self.engine)
+    def get_recipes(self, meal_type: str = None):
+        # Filter by meal type in SQL, sorted for the grouped recipe list
+        if meal_type is None:
+            return pd.read_sql("SELECT * FROM recipes ORDER BY meal_type, name", self.engine)
+        return pd.read_sql("SELECT * FROM recipes WHERE meal_type = %s ORDER BY name",
+                           self.engine, params=(meal_type,))
 
-    def get_selected_recipes(self):
-        return pd.read_sql("SELECT * FROM selected_recipes", self.engine)
+    def get_recipe_names(self) -> List[Tuple[int, str]]:
+        # Only id and name, sorted by name, for the recipe select box
+        with self.engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(text("SELECT id, name FROM recipes ORDER BY name")).fetchall()]
 
-    def update_selected_recipes(self, recipe_ids: List[int]):
+    def get_selected_ids(self) -> List[int]:
+        # Plain list of ids, no DataFrame needed
         with self.engine.connect() as conn:
-            # Delete all existing selected recipes
-            conn.execute(text("DELETE FROM selected_recipes"))
+            return [row[0] for row in conn.execute(text("SELECT recipe_id FROM selected_recipes")).fetchall()]
+
+    def update_selected_recipes(self, recipe_ids: List[int]):
+        recipe_ids = [int(id) for id in recipe_ids]
+        # Only touch rows that changed, in one transaction committed on exit
+        with self.engine.begin() as conn:
+            # Delete deselected recipes
+            conn.execute(
+                text("DELETE FROM selected_recipes WHERE recipe_id NOT IN :recipe_ids")
+                    .bindparams(bindparam("recipe_ids", expanding=True)),
+                {"recipe_ids": recipe_ids})
 
-            # Insert new selected recipes if any
+            # Insert newly selected recipes, already selected ones are skipped
             if recipe_ids:
                 conn.execute(
-                    text("INSERT INTO selected_recipes (recipe_id) VALUES (:recipe_id)"),
+                    text("INSERT INTO selected_recipes (recipe_id) VALUES (:recipe_id) ON CONFLICT DO NOTHING"),
                     [{"recipe_id": id} for id in recipe_ids])
-            conn.commit()
 
     def get_recipe_details(self, recipe_id: int):
-        recipe = pd.read_sql("SELECT * FROM recipes WHERE id = %s", self.engine, params=(recipe_id,))
-        recipe = recipe.to_dict(orient="records")[0] # Use as dict
+        # Recipe and ingredients in one round-trip
+        with self.engine.connect() as conn:
+            rows = conn.execute(text('''
+                SELECT r.id AS recipe_id, r.meal_type, r.name AS recipe_name, r.preparation,
+                       i.id, i.name, i.amount, i.unit, i.category
+                FROM recipes r
+                LEFT JOIN ingredients i ON i.recipe_id = r.id
+                WHERE r.id = :recipe_id
+                ORDER BY i.id'''), {"recipe_id": recipe_id}).fetchall()
+        if not rows:
+            return None, None
+
+        # Recipe as plain dict from the first row
+        first = rows[0]
+        recipe = {"id": first.recipe_id, "meal_type": first.meal_type,
+                  "name": first.recipe_name, "preparation": first.preparation}
 
-        ingredients = pd.read_sql("SELECT * FROM ingredients WHERE recipe_id = %s", self.engine, params=(recipe_id,))
+        # Ingredients from all rows (none if the LEFT JOIN found no match)
+        ingredients = pd.DataFrame.from_records(
+            [(row.id, row.recipe_id, row.name, row.amount, row.unit, row.category) for row in rows if row.id is not None],
+            columns=["id", "recipe_id", "name", "amount", "unit", "category"],
+            coerce_float=True)
 
         return recipe, ingredients
 
@@ -94,25 +131,34 @@ class MealDatabase:
     # ------------ #
     # SHOPPINGLIST #
     # ------------ #
+    def has_shopping_items(self) -> bool:
+        # Cheap check before running the shopping list join
+        with self.engine.connect() as conn:
+            return bool(conn.execute(text(
+                "SELECT EXISTS(SELECT 1 FROM selected_recipes) OR EXISTS(SELECT 1 FROM additional_ingredients)"
+            )).scalar())
+
     def get_shopping_list(self):
-        ingredients = pd.read_sql('''
-                SELECT i.name, i.category, 
-                       SUM(i.amount) as total_amount, 
-                       i.unit
-                FROM ingredients i
-                JOIN selected_recipes sr ON i.recipe_id = sr.recipe_id
-                GROUP BY i.name, i.unit, i.category
-                
-                UNION
-                
-                SELECT a.name, 'Sonstiges' as category, 
-                       COUNT(*) as total_amount, 
-                       'Stk' as unit
-                FROM additional_ingredients a
-                GROUP BY a.name''', self.engine)
-
-        ingredients = ingredients.sort_values(["category", "name"])
-        return ingredients
+        # Sorted in SQL by the order of CATEGORIES, then by name
+        return pd.read_sql('''
+                SELECT * FROM (
+                    SELECT i.name, i.category, 
+                           SUM(i.amount) as total_amount, 
+                           i.unit
+                    FROM ingredients i
+                    JOIN selected_recipes sr ON i.recipe_id = sr.recipe_id
+                    GROUP BY i.name, i.unit, i.category
+                    
+                    UNION
+                    
+                    SELECT a.name, 'Sonstiges' as category, 
+                           COUNT(*) as total_amount, 
+                           'Stk' as unit
+                    FROM additional_ingredients a
+                    GROUP BY a.name
+                ) s
+                ORDER BY array_position(%(categories)s::text[], s.category::text), s.name''',
+                self.engine, params={"categories": CATEGORIES})
 
     def add_additional_ingredient(self, name: str, amount: float=1, unit: str='Stk'):
         with self.engine.connect() as conn:
@@ -127,32 +173,34 @@ class MealDatabase:
     # ---------- #
 
     def add_recipe(self, meal_type: str, name: str, preparation: str, ingredients: List[Tuple[str, float, str, str]]):
-        with self.engine.connect() as conn:
-            conn.execute(
-                text("INSERT INTO recipes (meal_type, name, preparation) VALUES (:meal_type, :name, :preparation)"),
+        # Recipe and ingredients in one transaction, committed on exit or rolled back on error
+        with self.engine.begin() as conn:
+            # RETURNING gives us the new id without a second query
+            recipe_id = conn.execute(
+                text("INSERT INTO recipes (meal_type, name, preparation) VALUES (:meal_type, :name, :preparation) RETURNING id"),
                 {'meal_type': meal_type, 'name': name, 'preparation': preparation}
-            )
-            conn.commit()
-            recipe_id = pd.read_sql("SELECT id FROM recipes WHERE name = %s", self.engine, params=(name,)).iloc[0, 0]
+            ).scalar_one()
 
-            for ingredient in ingredients:
+            if ingredients:
+                # Insert all ingredients with one executemany
                 conn.execute(text(
                     """INSERT INTO ingredients 
                     (recipe_id, name, amount, unit, category) 
                     VALUES (:recipe_id, :name, :amount, :unit, :category)"""),
-                    {"recipe_id": int(recipe_id),
-                    "name": ingredient[0],
-                    "amount": ingredient[1],
-                    "unit": ingredient[2],
-                    "category": ingredient[3]}
-                )    
-            conn.commit()
+                    [{"recipe_id": int(recipe_id),
+                      "name": ing_name,
+                      "amount": amount,
+                      "unit": unit,
+                      "category": category}
+                     for ing_name, amount, unit, category in ingredients]
+                )
 
     # ----------- #
     # EDIT RECIPE #
     # ----------- #
     def edit_recipe(self, recipe_id: int, meal_type: str, name: str, preparation: str, ingredients: list):
-        with self.engine.connect() as conn:
+        # Update, delete and inserts in one transaction, committed on exit or rolled back on error
+        with self.engine.begin() as conn:
             # Update recipe details
             conn.execute(text('''UPDATE recipes 
                                  SET meal_type = :meal_type, 
@@ -163,31 +211,29 @@ class MealDatabase:
                         "meal_type": meal_type, 
                         "name": name, 
                         "preparation": preparation})
-            conn.commit()
 
-            # Update ingredients
+            # Update ingredients (delete and reinsert to keep the entered order)
             conn.execute(text("DELETE FROM ingredients WHERE recipe_id = :recipe_id"), {"recipe_id": recipe_id})
-            conn.commit()
 
-            for ing_name, amount, unit, category in ingredients:
+            if ingredients:
+                # Insert all ingredients with one executemany
                 conn.execute(text("""
                     INSERT INTO ingredients (recipe_id, name, amount, unit, category) VALUES (:recipe_id, :name, :amount, :unit, :category)"""),
-                {"recipe_id": recipe_id, 
-                "name": ing_name, 
-                "amount": amount, 
-                "unit": unit, 
-                "category": category})
-            conn.commit()
+                    [{"recipe_id": recipe_id, 
+                      "name": ing_name, 
+                      "amount": amount, 
+                      "unit": unit, 
+                      "category": category}
+                     for ing_name, amount, unit, category in ingredients])
 
         return True
 
     def delete_recipe(self, recipe_id: int):
-        with self.engine.connect() as conn:
+        with self.engine.begin() as conn:
             # Delete the recipe
             conn.execute(text("DELETE FROM recipes WHERE id = :recipe_id"), {"recipe_id": recipe_id})
             # Also delete associated ingredients
             conn.execute(text("DELETE FROM ingredients WHERE recipe_id = :recipe_id"), {"recipe_id": recipe_id})
-            conn.commit()
         return True
 
 
@@ -206,3 +252,8 @@ CATEGORIES = [
     "Tiefkühl",
     "Sonstiges"
 ]
+
+# Index lookups for the selectboxes
+MEAL_TYPE_IDX = {meal_type: i for i, meal_type in enumerate(MEAL_TYPES)}
+UNIT_IDX = {unit: i for i, unit in enumerate(UNITS)}
+CATEGORY_IDX = {category: i for i, category in enumerate(CATEGORIES)}
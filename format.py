@@ -1,12 +1,24 @@
 from decimal import Decimal
+import math
+import numpy as np
+import pandas as pd
 
 def format_amount(amount):
-    if isinstance(amount, (int, float)):
-        if amount % 1 == 0:  # Check if it's a whole number
-            return str(int(amount))
-        return f"{amount:.1f}"  # Return with one decimal place
-    elif isinstance(amount, Decimal):
-        if amount == amount.to_integral_value():
-            return str(int(amount))
-        return str(amount)
-    return str(amount)
\ No newline at end of file
+    # Scalar version of format_amount_series for single values, the pages use the Series version
+    if isinstance(amount, (int, float, Decimal)) and math.isfinite(amount):
+        whole = int(amount)
+        # Whole numbers without decimals, otherwise one decimal place
+        return str(whole) if whole == amount else f"{amount:.1f}"
+    return str(amount)  # Non-numeric values and nan/inf as plain strings
+
+def format_amount_series(amounts: pd.Series) -> pd.Series:
+    # Vectorized format_amount for a whole column of amounts
+    values = amounts.astype(float).to_numpy()
+    # nan/inf are never whole (like in format_amount) and are kept out of the int conversion
+    finite = np.isfinite(values)
+    finite_values = np.where(finite, values, 0)
+    is_whole = finite & (np.mod(finite_values, 1) == 0)
+    formatted = np.where(is_whole,
+                         finite_values.astype(np.int64).astype(str),  # Whole numbers without decimals
+                         np.char.mod("%.1f", values))                 # Otherwise one decimal place
+    return pd.Series(formatted, index=amounts.index)
\ No newline at end of file